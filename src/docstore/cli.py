@@ -1,6 +1,5 @@
 import datetime
 import functools
-import json
 import os
 import sys
 
@@ -60,6 +59,12 @@ def _require_existing_instance(inner):
 @click.option(
     "--thumbnail_width", default=200, help="Thumbnail width (px).", show_default=True
 )
+@click.option(
+    "--use_x_sendfile",
+    default=False,
+    is_flag=True,
+    help="Let the web server in front of docstore send files with X-Sendfile.",
+)
 @click.option("--debug", default=False, is_flag=True, help="Run in debug mode.")
 @click.option("--profile", default=False, is_flag=True, help="Run a profiler.")
 @click.pass_obj
@@ -143,7 +148,10 @@ def add_from_url(root, url, title, tags, source_url):  # pragma: no cover
 )
 @click.pass_obj
 def migrate(root, v1_path):  # pragma: no cover
-    documents = json.load(open(os.path.join(v1_path, "documents.json")))
+    import orjson
+
+    with open(os.path.join(v1_path, "documents.json"), "rb") as infile:
+        documents = orjson.loads(infile.read())
 
     for _, doc in documents.items():
         stored_file_path = os.path.join(v1_path, "files", doc["file_identifier"])
@@ -187,7 +195,7 @@ def delete(root, doc_ids):
 @click.pass_obj
 def verify(root):
     import collections
-    from docstore.documents import read_documents, sha256
+    from docstore.documents import file_checksum, read_documents
     import tqdm
 
     errors = collections.defaultdict(list)
@@ -198,8 +206,16 @@ def verify(root):
             if f.size != os.stat(f_path).st_size:
                 errors[f.id].append(f"Size mismatch\n  actual   = {os.stat(f_path).st_size}\n  expected = {f.size}")
 
-            if f.checksum != sha256(f_path):
-                errors[f.id].append(f"Checksum mismatch\n  actual   = {sha256(f_path)}\n  expected = {f.checksum}")
+            # Checksums are prefixed with their algorithm, e.g. "sha256:…"
+            algorithm = f.checksum.split(":", 1)[0]
+            try:
+                actual_checksum = file_checksum(f_path, algorithm=algorithm)
+            except ValueError:
+                errors[f.id].append(f"Unsupported checksum algorithm\n  checksum = {f.checksum}")
+                continue
+
+            if f.checksum != actual_checksum:
+                errors[f.id].append(f"Checksum mismatch\n  actual   = {actual_checksum}\n  expected = {f.checksum}")
 
     from pprint import pprint
     pprint(errors)
@@ -0,0 +1,168 @@
+"""
+An in-memory index of the documents, used to serve the web app.
+
+The documents only change when the database on disk changes, so anything
+we can work out from the documents alone is computed once and cached,
+rather than recomputed on every request.
+"""
+
+import collections
+import threading
+
+from docstore.documents import db_version, read_documents
+
+ATTRIBUTION_PREFIXES = ("by:", "from:")
+
+
+def _group_tags(tags):
+    """
+    Split a document's tags into attribution tags, e.g. "by:John Smith",
+    and everything else.
+    """
+    groups = {
+        prefix: tuple(t for t in tags if t.startswith(prefix))
+        for prefix in ATTRIBUTION_PREFIXES
+    }
+
+    # Sort case-insensitively, the same as Jinja's |sort filter.
+    groups["other"] = tuple(
+        sorted(
+            (t for t in tags if not t.startswith(ATTRIBUTION_PREFIXES)),
+            key=str.lower,
+        )
+    )
+
+    return groups
+
+
+class DocumentIndex:
+    def __init__(self, documents, *, version=None):
+        self.documents = documents
+
+        # The db_version() of the database these documents were read from.
+        self.version = version
+
+        # Document.tags is a list; checking the tags in a request against
+        # a set is much faster.
+        self.tags = [frozenset(doc.tags) for doc in documents]
+
+        # The attribution tags are shown in the title, and the rest of
+        # the tags are shown in a sorted list underneath.
+        self.tag_groups = [_group_tags(doc.tags) for doc in documents]
+
+        # Maps tag -> positions of the documents with that tag.
+        self.tag_index = collections.defaultdict(set)
+        for i, doc_tags in enumerate(self.tags):
+            for t in doc_tags:
+                self.tag_index[t].add(i)
+
+        self.tag_tally = collections.Counter(
+            {t: len(positions) for t, positions in self.tag_index.items()}
+        )
+
+        # Pages only show relative dates ("5 minutes ago") for documents
+        # saved in the last hour; see the ETag in the server.
+        self.newest_date_saved = max(
+            (doc.date_saved for doc in documents), default=None
+        )
+
+        # Maps (field, reverse) -> positions of every document in that
+        # order; these are filled in as they're requested.
+        self._sorted_positions = {}
+
+    def matching_positions(self, request_tags):
+        """
+        Returns the positions of the documents which are tagged with
+        every tag in ``request_tags``.
+
+        The result may be shared with the index, so don't modify it.
+        """
+        if not request_tags:
+            return range(len(self.documents))
+
+        if any(t not in self.tag_index for t in request_tags):
+            return set()
+
+        # Start with the rarest tag, so the set of matching documents is as
+        # small as possible from the outset, and stop as soon as it's empty.
+        tag_positions = sorted((self.tag_index[t] for t in request_tags), key=len)
+
+        result = tag_positions[0]
+        for positions in tag_positions[1:]:
+            if not result:
+                break
+            result = result & positions
+
+        return result
+
+    def sorted_positions(self, sort_by):
+        """
+        Returns the positions of every document, in the order given by
+        the ``sortBy`` query parameter.
+        """
+        if sort_by.startswith("date"):
+            field = "date_saved"
+        elif sort_by.startswith("title"):
+            field = "title"
+        else:
+            raise ValueError(f"Unrecognised sortBy query parameter: {sort_by}")
+
+        sort_reverse = sort_by in {"date (newest first)", "title (Z to A)"}
+
+        # Cache on the normalised order, not the raw sortBy string, or a client
+        # sending lots of different "date…" values could fill up the cache.
+        try:
+            return self._sorted_positions[(field, sort_reverse)]
+        except KeyError:
+            pass
+
+        if field == "date_saved":
+            sort_key = lambda i: self.documents[i].date_saved
+        else:
+            sort_key = lambda i: self.documents[i].title.lower()
+
+        result = sorted(range(len(self.documents)), key=sort_key, reverse=sort_reverse)
+        self._sorted_positions[(field, sort_reverse)] = result
+
+        return result
+
+    def tally_tags(self, positions):
+        """
+        Count how many times each tag is used by the documents at ``positions``.
+        """
+        # If every document matches, we can use the tally for the entire
+        # collection -- this is the majority of requests.
+        if len(positions) == len(self.documents):
+            return self.tag_tally
+
+        tag_tally = collections.Counter()
+        for i in positions:
+            tag_tally.update(self.tags[i])
+
+        return tag_tally
+
+
+# Maps root -> DocumentIndex
+_cached_indexes = {}
+_cached_indexes_lock = threading.Lock()
+
+
+def read_document_index(root):
+    """
+    Get a DocumentIndex for all the documents.
+    """
+    with _cached_indexes_lock:
+        version = db_version(root)
+
+        try:
+            cached_index = _cached_indexes[str(root)]
+        except KeyError:
+            pass
+        else:
+            if cached_index.version == version:
+                return cached_index
+
+        index = DocumentIndex(read_documents(root), version=version)
+        _cached_indexes[str(root)] = index
+
+        return index
@@ -1,18 +1,24 @@
+import collections
+import concurrent.futures
 import hashlib
-import json
+import mmap
 import os
+import secrets
 import shutil
+import threading
 
 import cattr
+import orjson
 
-from docstore.file_normalisation import normalised_filename_copy
+from docstore.file_normalisation import create_directory, normalised_filename_copy
 from docstore.models import (
-    DocstoreEncoder,
     Document,
     File,
     Thumbnail,
     from_json,
+    from_json_line,
     to_json,
+    to_json_line,
 )
 from docstore.text_utils import slugify
 from docstore.thumbnails import create_thumbnail, get_dimensions
@@ -26,10 +32,49 @@ def db_path(root):
     return os.path.join(root, "documents.json")
 
 
-_cached_documents = {
-    "last_modified": None,
-    "contents": None,
-}
+def log_path(root):
+    """
+    Returns the path to the log of documents added since the database
+    was last written.
+    """
+    return os.path.join(root, "documents.log")
+
+
+# documents.log is never folded back into documents.json while it's
+# smaller than this.
+MIN_LOG_COMPACTION_SIZE = 64 * 1024
+
+
+# The inode tells us if a file has been replaced (e.g. by os.replace in
+# write_documents), even if the new file has the same size and mtime.
+_FileVersion = collections.namedtuple("FileVersion", ["inode", "mtime_ns", "size"])
+
+
+def _file_version(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    return _FileVersion(inode=stat.st_ino, mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+
+
+def db_version(root):
+    """
+    Returns a value that changes whenever the database on disk changes,
+    or None if there isn't a database yet.
+    """
+    version = _file_version(db_path(root))
+
+    if version is None:
+        return None
+
+    return (version, _file_version(log_path(root)))
+
+
+# Maps root -> {"version": db_version(root), "contents": List[Document]}
+_cached_documents = {}
+_cached_documents_lock = threading.Lock()
 
 
 def read_documents(root):
@@ -39,60 +84,283 @@ def read_documents(root):
     # JSON parsing is somewhat expensive.  By caching the result rather than
     # going to disk each time, we see a ~10x speedup in returning responses
     # from the server.
-    try:
+    #
+    # The server may be running multiple threads, so hold the lock while
+    # we reparse -- otherwise concurrent requests would all parse the file.
+    with _cached_documents_lock:
+        version = db_version(root)
+
+        if version is None:
+            _cached_documents.pop(str(root), None)
+            return []
+
+        try:
+            cached = _cached_documents[str(root)]
+        except KeyError:
+            cached = None
+        else:
+            if cached["version"] == version:
+                return cached["contents"]
+
+        db_file_version, log_file_version = version
+
+        # If the only change is new documents appended to the log, we only
+        # need to read the new lines, rather than the whole database.
+        #
+        # This makes a copy of the cached list rather than appending to it,
+        # because previous callers may still be holding onto that list.
         if (
-            _cached_documents["last_modified"] is not None
-            and os.stat(db_path(root)).st_mtime <= _cached_documents["last_modified"]
+            cached is not None
+            and cached["version"][0] == db_file_version
+            and log_file_version is not None
         ):
-            return _cached_documents["contents"]
-    except FileNotFoundError:
-        pass
+            _, cached_log_file_version = cached["version"]
+
+            if cached_log_file_version is None:
+                start = 0
+            elif cached_log_file_version.inode == log_file_version.inode:
+                start = cached_log_file_version.size
+            else:
+                start = None
+
+            if start is not None and start <= log_file_version.size:
+                new_documents, log_end = _read_log(
+                    root, start=start, end=log_file_version.size
+                )
+                result = cached["contents"] + new_documents
+                version = (db_file_version, log_file_version._replace(size=log_end))
+                _cached_documents[str(root)] = {"version": version, "contents": result}
+                return result
+
+        # Map the file into memory and let orjson parse it in place, rather
+        # than reading a copy of the whole file into a bytes object first.
+        try:
+            with open(db_path(root), "rb") as infile:
+                with mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    with memoryview(mm) as json_bytes:
+                        result = from_json(json_bytes)
+        except FileNotFoundError:
+            return []
+
+        if log_file_version is not None:
+            logged_documents, log_end = _read_log(root, end=log_file_version.size)
+
+            # If somebody reads the database after documents.json has been
+            # rewritten but before the log has been cleared, the log will
+            # repeat documents that are already in documents.json.
+            stored_ids = {d.id for d in result}
+
+            result.extend(d for d in logged_documents if d.id not in stored_ids)
+
+            # Remember how much of the log we've parsed, rather than its size --
+            # if somebody was halfway through writing a line, we need to read
+            # the rest of that line next time.
+            version = (db_file_version, log_file_version._replace(size=log_end))
+
+        _cached_documents[str(root)] = {"version": version, "contents": result}
+
+        return result
+
+
+def _read_log(root, *, start=0, end):
+    """
+    Returns the documents in the log between the byte offsets ``start``
+    and ``end``, and the offset of the end of the last complete line.
 
+    We only read up to ``end`` so we don't pick up any documents that were
+    appended after we checked the size of the log.
+    """
     try:
-        with open(db_path(root)) as infile:
-            result = from_json(infile.read())
+        infile = open(log_path(root), "rb")
     except FileNotFoundError:
-        return []
+        return [], start
+
+    with infile:
+        infile.seek(start)
+        log_bytes = infile.read(end - start)
+
+    # If a write to the log was interrupted or is still in progress, it may
+    # end with part of a line.  Skip it, rather than failing to parse it.
+    complete_size = log_bytes.rfind(b"\n") + 1
+
+    documents = [
+        from_json_line(line) for line in log_bytes[:complete_size].splitlines()
+    ]
+
+    return documents, start + complete_size
+
+
+def _truncate_partial_line(log_file):
+    """
+    If the log ends with part of a line (because a previous write was
+    interrupted), remove it, so it doesn't get glued onto the next line.
+    """
+    log_size = log_file.seek(0, os.SEEK_END)
+
+    # Look backwards through the file for the end of the last complete line.
+    # Usually that's the last byte of the file, so this only reads one block.
+    block_end = log_size
+    last_line_end = 0
+
+    while block_end > 0:
+        block_start = max(0, block_end - 4096)
+        log_file.seek(block_start)
+        newline = log_file.read(block_end - block_start).rfind(b"\n")
+
+        if newline != -1:
+            last_line_end = block_start + newline + 1
+            break
+
+        block_end = block_start
+
+    if last_line_end != log_size:
+        log_file.truncate(last_line_end)
+
+
+# Guards appends to documents.log, so lines written by different threads
+# can't interleave and any compaction sees a complete log.
+_append_lock = threading.Lock()
+
+
+def append_document(*, root, document):
+    """
+    Add a single document to the database.
+
+    Rather than rewriting the whole of documents.json, this adds the document
+    to the end of documents.log, which is one line of JSON per document.
+    The log gets folded back into documents.json the next time it's written.
+    """
+    append_documents(root=root, documents=[document])
+
 
-    _cached_documents["last_modified"] = os.stat(db_path(root)).st_mtime
-    _cached_documents["contents"] = result
+def append_documents(*, root, documents):
+    """
+    Add several documents to the database, with a single write to the log.
+    """
+    # Don't touch the log if there's nothing to add, or we'd change the
+    # db_version() and throw away everybody's cached documents.
+    if not documents:
+        return
+
+    with _append_lock:
+        if not os.path.exists(db_path(root)):
+            write_documents(root=root, documents=documents)
+            return
 
-    return result
+        with open(log_path(root), "a+b") as out_file:
+            _truncate_partial_line(out_file)
+            out_file.write(b"".join(to_json_line(doc) for doc in documents))
+            out_file.flush()
+            os.fsync(out_file.fileno())
+
+            log_size = out_file.tell()
+
+        # Once the log is as big as documents.json, fold it back in, so the log
+        # doesn't grow forever.  Rewriting documents.json is O(documents), but
+        # waiting this long means each rewrite is shared by lots of new documents.
+        if log_size >= max(os.stat(db_path(root)).st_size, MIN_LOG_COMPACTION_SIZE):
+            write_documents(root=root, documents=read_documents(root))
 
 
 def write_documents(*, root, documents):
-    json_string = to_json(documents)
+    json_bytes = to_json(documents)
 
     os.makedirs(root, exist_ok=True)
 
-    with open(db_path(root), "w") as out_file:
-        out_file.write(json_string)
+    # Write to a temporary file, then rename it over the database.  Anybody
+    # reading the database sees either the old file or the new file, never
+    # a partially-written file.
+    tmp_path = db_path(root) + "." + secrets.token_hex(4) + ".tmp"
+
+    with open(tmp_path, "wb") as out_file:
+        out_file.write(json_bytes)
+
+        # Make sure the new database is on disk before it replaces the old
+        # one and we delete the log -- otherwise a crash could lose both.
+        out_file.flush()
+        os.fsync(out_file.fileno())
+
+    os.replace(tmp_path, db_path(root))
+
+    # Everything in the log has now been written to documents.json.
+    try:
+        os.unlink(log_path(root))
+    except FileNotFoundError:
+        pass
+
+
+def file_checksum(path, *, algorithm="sha256"):
+    """
+    Returns the checksum of the file at ``path``, prefixed with the name of
+    the hashlib algorithm used, e.g. "sha256:683cbe…".
+    """
+    with open(path, "rb", buffering=0) as infile:
+        # Read the file into a single reusable buffer, rather than allocating
+        # a new bytes object for every block.  hashlib.file_digest() does this
+        # for us, but it was only added in Python 3.11.
+        if hasattr(hashlib, "file_digest"):
+            h = hashlib.file_digest(infile, algorithm)
+        else:
+            h = hashlib.new(algorithm)
+            buf = memoryview(bytearray(256 * 1024))
+            while True:
+                size = infile.readinto(buf)
+                if not size:
+                    break
+                h.update(buf[:size])
+
+    return "%s:%s" % (algorithm, h.hexdigest())
 
 
 def sha256(path):
-    h = hashlib.sha256()
-    with open(path, "rb") as infile:
-        for byte_block in iter(lambda: infile.read(4096), b""):
-            h.update(byte_block)
+    return file_checksum(path, algorithm="sha256")
 
-    return "sha256:%s" % h.hexdigest()
 
+class _SizeCountingHasher:
+    """
+    Wraps a hashlib object, and counts the bytes passed to it -- when it's
+    used to hash a file while copying it, that's the size of the file.
+    """
 
-def store_new_document(*, root, path, title, tags, source_url, date_saved):
+    __slots__ = ("_hasher", "size")
+
+    def __init__(self, hasher):
+        self._hasher = hasher
+        self.size = 0
+
+    def update(self, data):
+        self._hasher.update(data)
+        self.size += len(data)
+
+    def hexdigest(self):
+        return self._hasher.hexdigest()
+
+
+def _create_new_document(*, root, path, title, tags, source_url, date_saved):
+    """
+    Copy a file into the store and create its thumbnail, and return the
+    Document that describes it.  This doesn't record it in the database.
+    """
     filename = os.path.basename(path)
 
     # Files are sharded by the first letter of their filename,
     # e.g. "aardvark.png" is saved in "a/aardvark.png"
     shard = slugify(filename)[0].lower()
 
-    dst = os.path.join(root, "files", shard, filename)
+    # The layout of the store is fixed and always "/"-separated, so build
+    # paths with f-strings rather than the (slower) os.path functions.
+    dst = f"{root}/files/{shard}/{filename}"
 
-    out_path = normalised_filename_copy(src=path, dst=dst)
+    # Work out the checksum and size as we copy the file, rather than
+    # reading or stat-ing it again afterwards.
+    hasher = _SizeCountingHasher(hashlib.sha256())
+    out_path = normalised_filename_copy(src=path, dst=dst, hasher=hasher)
 
     thumbnail_path = create_thumbnail(out_path)
-    thumbnail_name = os.path.basename(thumbnail_path)
-    thumb_out_path = os.path.join(root, "thumbnails", thumbnail_name[0], thumbnail_name)
-    os.makedirs(os.path.dirname(thumb_out_path), exist_ok=True)
+    thumbnail_name = thumbnail_path.rsplit("/", 1)[-1]
+    thumb_out_dir = f"{root}/thumbnails/{thumbnail_name[0]}"
+    thumb_out_path = f"{thumb_out_dir}/{thumbnail_name}"
+    create_directory(thumb_out_dir)
     shutil.move(thumbnail_path, thumb_out_path)
 
     tint_color = choose_tint_color(thumbnail_path=thumb_out_path, file_path=out_path)
@@ -101,7 +369,7 @@ def store_new_document(*, root, path, title, tags, source_url, date_saved):
         int(component * 255) for component in tint_color
     )
 
-    new_document = Document(
+    return Document(
         title=title,
         date_saved=date_saved,
         tags=tags,
@@ -109,8 +377,8 @@ def store_new_document(*, root, path, title, tags, source_url, date_saved):
             File(
                 filename=filename,
                 path=os.path.relpath(out_path, root),
-                size=os.stat(out_path).st_size,
-                checksum=sha256(out_path),
+                size=hasher.size,
+                checksum="sha256:%s" % hasher.hexdigest(),
                 source_url=source_url,
                 thumbnail=Thumbnail(
                     path=os.path.relpath(thumb_out_path, root),
@@ -122,10 +390,18 @@ def store_new_document(*, root, path, title, tags, source_url, date_saved):
         ],
     )
 
-    documents = read_documents(root)
-    documents.append(new_document)
 
-    write_documents(root=root, documents=documents)
+def store_new_document(*, root, path, title, tags, source_url, date_saved):
+    new_document = _create_new_document(
+        root=root,
+        path=path,
+        title=title,
+        tags=tags,
+        source_url=source_url,
+        date_saved=date_saved,
+    )
+
+    append_document(root=root, document=new_document)
 
     # Don't delete the original file until it's been successfully recorded
     # and a thumbnail created.
@@ -134,6 +410,32 @@ def store_new_document(*, root, path, title, tags, source_url, date_saved):
     return new_document
 
 
+def store_new_documents(*, root, new_documents):
+    """
+    Store several documents at once.  Each entry in ``new_documents`` is
+    a dict of the arguments to ``store_new_document``, apart from ``root``.
+
+    Copying, hashing and thumbnailing is mostly I/O and subprocesses, so
+    the files are processed in parallel, then recorded in one append.
+    """
+    max_workers = min(8, os.cpu_count() or 1)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        stored_documents = list(
+            executor.map(
+                lambda kwargs: _create_new_document(root=root, **kwargs),
+                new_documents,
+            )
+        )
+
+    append_documents(root=root, documents=stored_documents)
+
+    for kwargs in new_documents:
+        os.unlink(kwargs["path"])
+
+    return stored_documents
+
+
 def pairwise_merge_documents(root, *, doc1, doc2, new_title, new_tags):
     """
     Merge the files on two documents together.
@@ -173,10 +475,11 @@ def delete_document(root, *, doc_id):
         )
         os.unlink(os.path.join(root, f.thumbnail.path))
 
-    with open(os.path.join(delete_dir, "document.json"), "w") as outfile:
+    with open(os.path.join(delete_dir, "document.json"), "wb") as outfile:
         outfile.write(
-            json.dumps(
-                cattr.unstructure(doc), indent=2, sort_keys=True, cls=DocstoreEncoder
+            orjson.dumps(
+                cattr.unstructure(doc),
+                option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS,
             )
         )
 
@@ -1,11 +1,48 @@
 import os
 import secrets
 import shutil
+import threading
 
 from docstore.text_utils import slugify
 
+# Directories we know exist, because we've already created them.
+_created_directories = set()
+_created_directories_lock = threading.Lock()
 
-def normalised_filename_copy(*, src, dst):
+
+def create_directory(path):
+    """
+    Creates the directory ``path``, if it doesn't exist already.
+
+    Files are saved in a small number of shard directories, so after the
+    first few files go in, almost every ``os.makedirs`` would be a no-op.
+    Remembering which directories we've created lets us skip the syscall.
+    This assumes nothing deletes those directories while we're running.
+    """
+    path = os.fspath(path)
+
+    with _created_directories_lock:
+        if path in _created_directories:
+            return
+
+    os.makedirs(path, exist_ok=True)
+
+    with _created_directories_lock:
+        _created_directories.add(path)
+
+
+def _copy_and_hash(infile, out_file, *, hasher):
+    buf = memoryview(bytearray(1024 * 1024))
+
+    while True:
+        size = infile.readinto(buf)
+        if not size:
+            break
+        hasher.update(buf[:size])
+        out_file.write(buf[:size])
+
+
+def normalised_filename_copy(*, src, dst, hasher=None):
     """
     Copies a file from ``src`` to ``dst``.
 
@@ -22,12 +59,16 @@ def normalised_filename_copy(*, src, dst):
     e.g. if you pass dst=``Statement.pdf``, it might create files like
     ``Statement.pdf``, ``Statement_1c5e.pdf``, ``Statement_3fc9.pdf``
 
+    If you pass a ``hasher`` (e.g. ``hashlib.sha256()``), it's updated with
+    the contents of the file as it's copied.  This means you can get the
+    checksum of the file without reading it a second time.
+
     Returns the name of the final file.
 
     """
     out_dir, filename = os.path.split(dst)
 
-    os.makedirs(out_dir, exist_ok=True)
+    create_directory(out_dir)
 
     name, ext = os.path.splitext(filename)
     name = slugify(name)
@@ -38,7 +79,10 @@ def normalised_filename_copy(*, src, dst):
         try:
             with open(out_path, "xb") as out_file:
                 with open(src, "rb") as infile:
-                    shutil.copyfileobj(infile, out_file)
+                    if hasher is None:
+                        shutil.copyfileobj(infile, out_file)
+                    else:
+                        _copy_and_hash(infile, out_file, hasher=hasher)
         except FileExistsError:
             out_path = os.path.join(out_dir, name + "_" + secrets.token_hex(2) + ext)
         else:
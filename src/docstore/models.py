@@ -1,10 +1,11 @@
 import datetime
-import json
+import sys
 from typing import List
 import uuid
 
 import attr
 import cattr
+import orjson
 
 from docstore.git import current_commit
 
@@ -33,24 +34,31 @@ def _convert_to_dimensions(d):
         return Dimensions(**d)
 
 
+def _convert_to_tags(tags):
+    # The same tags are used on lots of documents; interning them means
+    # we only keep one copy of each tag in memory, and comparing tags can
+    # use the identity check rather than comparing the strings.
+    return [sys.intern(t) for t in tags]
+
+
 def _convert_to_file(f_list):
     return [f if isinstance(f, File) else File(**f) for f in f_list]
 
 
-@attr.s
+@attr.s(slots=True)
 class Dimensions:
     width = attr.ib(type=int)
     height = attr.ib(type=int)
 
 
-@attr.s
+@attr.s(slots=True)
 class Thumbnail:
     path = attr.ib(type=str)
     dimensions = attr.ib(type=Dimensions, converter=_convert_to_dimensions)
     tint_color = attr.ib(type=str)
 
 
-@attr.s
+@attr.s(slots=True)
 class File:
     filename = attr.ib(converter=str)
     path = attr.ib(type=str)
@@ -62,26 +70,18 @@ class File:
     id = attr.ib(default=attr.Factory(lambda: str(uuid.uuid4())))
 
 
-@attr.s
+@attr.s(slots=True)
 class Document:
     title = attr.ib(type=str)
     id = attr.ib(default=attr.Factory(lambda: str(uuid.uuid4())))
     date_saved = attr.ib(factory=datetime.datetime.now, converter=_convert_to_datetime)
-    tags = attr.ib(factory=list)
+    tags = attr.ib(factory=list, converter=_convert_to_tags)
     files = attr.ib(factory=list, converter=_convert_to_file)
 
 
-class DocstoreEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, datetime.datetime):
-            return obj.isoformat()
-        else:  # pragma: no cover
-            return super().default(obj)
-
-
 def to_json(documents):
     """
-    Returns a JSON string containing all the documents.
+    Returns a JSON-encoded bytestring containing all the documents.
     """
     if not isinstance(documents, list) or not all(
         isinstance(d, Document) for d in documents
@@ -92,7 +92,9 @@ def to_json(documents):
     # function goes faster if the documents are already in the right order.
     documents = sorted(documents, key=lambda d: d.date_saved, reverse=True)
 
-    return json.dumps(
+    # orjson knows how to serialise datetimes, and writes them in the same
+    # format as datetime.isoformat(), which is what _convert_to_datetime reads.
+    return orjson.dumps(
         {
             "docstore": {
                 "db_schema": DB_SCHEMA,
@@ -101,16 +103,34 @@ def to_json(documents):
             },
             "documents": cattr.unstructure(documents),
         },
-        indent=2,
-        sort_keys=True,
-        cls=DocstoreEncoder,
+        option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS,
     )
 
 
 def from_json(json_string):
     """
-    Parses a JSON string containing all the documents.
+    Parses a JSON string (or bytes, or a memoryview) containing all the documents.
     """
-    parsed_structure = json.loads(json_string)
+    parsed_structure = orjson.loads(json_string)
     assert parsed_structure["docstore"]["db_schema"] == DB_SCHEMA
     return cattr.structure(parsed_structure["documents"], List[Document])
+
+
+def to_json_line(document):
+    """
+    Returns a single line of JSON containing one document.
+    """
+    if not isinstance(document, Document):
+        raise TypeError("Expected type Document!")
+
+    return orjson.dumps(
+        cattr.unstructure(document),
+        option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_SORT_KEYS,
+    )
+
+
+def from_json_line(json_line):
+    """
+    Parses a single line of JSON containing one document.
+    """
+    return cattr.structure(orjson.loads(json_line), Document)
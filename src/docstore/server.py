@@ -1,36 +1,32 @@
-import collections
 import datetime
 import functools
 import hashlib
 import os
 import secrets
 import urllib.parse
-from urllib.parse import parse_qsl, urlparse, urlencode
+from urllib.parse import urlencode
 
 from flask import (
     Flask,
     make_response,
-    render_template,
     request,
     send_file,
     send_from_directory,
+    stream_with_context,
 )
 import hyperlink
 import smartypants
 from werkzeug.middleware.profiler import ProfilerMiddleware
 
-from docstore.documents import find_original_filename, read_documents
+from docstore.document_index import read_document_index
+from docstore.documents import find_original_filename
+from docstore.git import current_commit
 from docstore.tag_cloud import TagCloud
 from docstore.tag_list import render_tag_list
 from docstore.text_utils import hostname, pretty_date
 
 
-def tags_with_prefix(document, prefix):
-    return [t for t in document.tags if t.startswith(prefix)]
-
-
-def tags_without_prefix(document, prefix):
-    return [t for t in document.tags if not t.startswith(prefix)]
+PAGE_SIZE = 100
 
 
 def url_without_sortby(u):
@@ -38,6 +34,23 @@ def url_without_sortby(u):
     return str(url.remove("sortBy"))
 
 
+def render_template_stream(app, template_name, **context):
+    """
+    Renders a template as a stream of strings, so the start of the page can
+    be sent to the browser while the rest of it is still being rendered.
+
+    This is like ``flask.render_template``, but Flask's own
+    ``stream_template`` isn't available in the versions we support.
+    """
+    app.update_template_context(context)
+    template = app.jinja_env.get_template(template_name)
+
+    stream = template.stream(context)
+    stream.enable_buffering(size=100)
+
+    return stream_with_context(stream)
+
+
 def serve_file(*, root, shard, filename):
     """
     Serves a file which has been saved in docstore.
@@ -59,36 +72,39 @@ def serve_file(*, root, shard, filename):
     return response
 
 
-def create_app(title, root, thumbnail_width):
+def create_app(title, root, thumbnail_width, use_x_sendfile=False):
     app = Flask(__name__)
 
     app.config["THUMBNAIL_WIDTH"] = thumbnail_width
 
+    # If docstore is running behind a web server that supports X-Sendfile
+    # (e.g. Apache with mod_xsendfile), Flask will tell the web server to
+    # send the files and thumbnails, rather than reading them in Python.
+    app.config["USE_X_SENDFILE"] = use_x_sendfile
+
     app.jinja_env.trim_blocks = True
     app.jinja_env.lstrip_blocks = True
 
     app.jinja_env.filters["hostname"] = hostname
-    app.jinja_env.filters["pretty_date"] = lambda d: pretty_date(
-        d, now=datetime.datetime.now()
-    )
+    app.jinja_env.filters["pretty_date"] = pretty_date
     app.jinja_env.filters["render_tag_list"] = render_tag_list
     app.jinja_env.filters["smartypants"] = smartypants.smartypants
     app.jinja_env.filters["url_without_sortby"] = url_without_sortby
 
-    app.jinja_env.filters["tags_with_prefix"] = tags_with_prefix
-    app.jinja_env.filters["tags_without_prefix"] = tags_without_prefix
+    # Included in the ETag on the list of documents, so upgrading docstore
+    # invalidates any pages the browser has already cached.  This has to be
+    # the same in every server process, or a browser would only get a 304
+    # from the process that served the page in the first place.
+    etag_salt = current_commit()
 
     @app.route("/")
     def list_documents():
         request_tags = set(request.args.getlist("tag"))
-        documents = [
-            doc for doc in read_documents(root) if request_tags.issubset(set(doc.tags))
-        ]
+        index = read_document_index(root)
 
-        tag_tally = collections.Counter()
-        for doc in documents:
-            for t in doc.tags:
-                tag_tally[t] += 1
+        # This is sorted so equivalent URLs hit the same entries in
+        # the add_tag/remove_tag/set_page caches.
+        query_string = tuple(sorted(request.args.items(multi=True)))
 
         try:
             page = int(request.args["page"])
@@ -97,41 +113,100 @@ def create_app(title, root, thumbnail_width):
 
         sort_by = request.args.get("sortBy", "date (newest first)")
 
-        if sort_by.startswith("date"):
-            sort_key = lambda d: d.date_saved
-        elif sort_by.startswith("title"):
-            sort_key = lambda d: d.title.lower()
-        elif sort_by == "random":
+        now = datetime.datetime.now()
+
+        # The page only changes if the documents change, or the dates
+        # move on.  If the browser already has the page, we can skip
+        # rendering it again.
+        #
+        # Documents saved in the last hour have relative dates ("just now",
+        # "5 minutes ago"), which can change every minute.  These change at
+        # a different second for each document, so a cached page may show
+        # them up to a minute out of date.  Older documents only change
+        # at midnight ("earlier today" becomes "yesterday").
+        #
+        # Random sorts are reshuffled every time you go to the first page,
+        # so we don't try to cache those.
+        if (
+            index.newest_date_saved is not None
+            and now - index.newest_date_saved < datetime.timedelta(hours=1)
+        ):
+            dates_key = now.replace(second=0, microsecond=0)
+        else:
+            dates_key = now.date()
+
+        etag = hashlib.md5(
+            repr(
+                (
+                    etag_salt,
+                    index.version,
+                    query_string,
+                    app.config["THUMBNAIL_WIDTH"],
+                    dates_key,
+                )
+            ).encode("utf8")
+        ).hexdigest()
+
+        if sort_by != "random" and request.if_none_match.contains_weak(etag):
+            resp = make_response("", 304)
+            resp.set_etag(etag, weak=True)
+            return resp
+
+        positions = index.matching_positions(request_tags)
+        tag_tally = index.tally_tags(positions)
+
+        if sort_by == "random":
             if page == 1:
                 app.config["_RANDOM_SEED"] = secrets.token_bytes()
             seed = app.config["_RANDOM_SEED"]
 
-            def sort_key(d):
+            def sort_key(i):
                 h = hashlib.md5()
-                h.update(d.id.encode("utf8"))
+                h.update(index.documents[i].id.encode("utf8"))
                 h.update(seed)
                 return h.hexdigest()
-        else:
-            raise ValueError(f"Unrecognised sortBy query parameter: {sort_by}")
 
-        if sort_by in {"date (newest first)", "title (Z to A)"}:
-            sort_reverse = True
+            ordered_positions = sorted(positions, key=sort_key)
         else:
-            sort_reverse = False
+            ordered_positions = index.sorted_positions(sort_by)
+
+            if len(positions) != len(index.documents):
+                ordered_positions = [i for i in ordered_positions if i in positions]
 
-        html = render_template(
+        # Only pass the documents on the current page to the template,
+        # rather than every matching document.
+        page_start = (page - 1) * PAGE_SIZE
+        page_positions = ordered_positions[page_start : page_start + PAGE_SIZE]
+
+        documents = [index.documents[i] for i in page_positions]
+        tag_groups = {
+            index.documents[i].id: index.tag_groups[i] for i in page_positions
+        }
+
+        html = render_template_stream(
+            app,
             "index.html",
-            documents=sorted(documents, key=sort_key, reverse=sort_reverse),
+            documents=documents,
+            document_count=len(ordered_positions),
+            page_size=PAGE_SIZE,
+            tag_groups=tag_groups,
             request_tags=request_tags,
-            query_string=tuple(parse_qsl(urlparse(request.url).query)),
+            query_string=query_string,
             tag_tally=tag_tally,
             title=title,
             page=page,
             sort_by=sort_by,
+            now=now,
             TagCloud=TagCloud,
         )
 
-        return html
+        resp = app.response_class(html, mimetype="text/html")
+
+        if sort_by != "random":
+            resp.set_etag(etag, weak=True)
+            resp.headers["Cache-Control"] = "no-cache"
+
+        return resp
 
     @app.route("/thumbnails/<shard>/<filename>")
     def thumbnails(shard, filename):
@@ -147,20 +222,21 @@ def create_app(title, root, thumbnail_width):
     )
 
     @app.template_filter("add_tag")
-    @functools.lru_cache()
+    @functools.lru_cache(maxsize=4096)
     def add_tag(query_string, tag):
         return "?" + urlencode(
             [(k, v) for k, v in query_string if k != "page"] + [("tag", tag)]
         )
 
     @app.template_filter("remove_tag")
+    @functools.lru_cache(maxsize=4096)
     def remove_tag(query_string, tag):
         return "?" + urlencode(
             [(k, v) for k, v in query_string if (k, v) != ("tag", tag)]
         )
 
     @app.template_filter("set_page")
-    @functools.lru_cache()
+    @functools.lru_cache(maxsize=4096)
     def set_page(query_string, page):
         pageless_qs = [(k, v) for k, v in query_string if k != "page"]
         if page == 1:
@@ -1,7 +1,9 @@
 import datetime
+import functools
 import os
 import re
 import sys
+import unicodedata
 
 from unidecode import unidecode
 
@@ -19,6 +21,14 @@ def common_prefix(values):
     return prefix
 
 
+_SEPARATING_PUNCTUATION_RE = re.compile("[–—/:;,._]")
+_DISALLOWED_SLUG_CHARACTERS_RE = re.compile(r"[^a-z0-9 -]")
+_SPACES_AND_HYPHENS_RE = re.compile(r"[ -]+")
+# U+0363 to U+036F are combining *letters* (e.g. "ͤ"), which unidecode
+# transliterates rather than drops, so they aren't included here.
+_COMBINING_DIACRITICS_RE = re.compile("[\u0300-\u0362]")
+
+
 def slugify(u):
     """
     Convert Unicode string into blog slug.
@@ -26,11 +36,29 @@ def slugify(u):
     Based on http://www.leancrew.com/all-this/2014/10/asciifying/
 
     """
-    u = re.sub("[–—/:;,._]", "-", u)  # replace separating punctuation
-    a = unidecode(u).lower()  # best ASCII substitutions, lowercased
-    a = re.sub(r"[^a-z0-9 -]", "", a)  # delete any other characters
-    a = a.replace(" ", "-")  # spaces to hyphens
-    a = re.sub(r"-+", "-", a)  # condense repeated hyphens
+    u = _SEPARATING_PUNCTUATION_RE.sub("-", u)  # replace separating punctuation
+
+    # best ASCII substitutions, lowercased.  unidecode returns ASCII strings
+    # unchanged, so we can skip it (it's relatively slow) if there's nothing
+    # to substitute.
+    #
+    # Most other strings are Latin letters with accents, e.g. "Crème Brûlée".
+    # Splitting off the accents (NFD) and dropping them is much faster than
+    # unidecode.  We use NFD rather than NFKD so spacing accents like "´"
+    # and modifier letters like "ᶜ" stay non-ASCII; they, and anything else
+    # that's still non-ASCII afterwards (e.g. "ß", CJK), go through unidecode.
+    if u.isascii():
+        a = u.lower()
+    else:
+        stripped = _COMBINING_DIACRITICS_RE.sub("", unicodedata.normalize("NFD", u))
+
+        if stripped.isascii():
+            a = stripped.lower()
+        else:
+            a = unidecode(u).lower()
+
+    a = _DISALLOWED_SLUG_CHARACTERS_RE.sub("", a)  # delete any other characters
+    a = _SPACES_AND_HYPHENS_RE.sub("-", a)  # spaces to hyphens, condensed
     return a
 
 
@@ -40,23 +68,33 @@ def pretty_date(d, now):
         return "just now"
     elif delta.total_seconds() < 60 * 60:
         return f"{int(delta.seconds / 60)} minutes ago"
-    elif d.date() == now.date():
+    else:
+        return _pretty_day(d.date(), today=now.date())
+
+
+@functools.lru_cache(maxsize=4096)
+def _pretty_day(day, *, today):
+    # Anything older than an hour is described by its day, which doesn't
+    # depend on the exact time -- so we can cache the result, and only pay
+    # for the date arithmetic once per document per day.
+    if day == today:
         return "earlier today"
-    elif d.date() == now.date() - datetime.timedelta(days=1):
+    elif day == today - datetime.timedelta(days=1):
         return "yesterday"
     else:
         for days in range(2, 8):
-            if d.date() == now.date() - datetime.timedelta(days=days):
+            if day == today - datetime.timedelta(days=days):
                 return f"{days} days ago"
-        return d.strftime("%-d %b %Y")
+        return day.strftime("%-d %b %Y")
 
 
+@functools.lru_cache(maxsize=4096)
 def hostname(url):
     """
     Returns a guess for the hostname of a URL to display in the <a> tag.
     """
     try:
-        return url.split("/")[2]
+        return url.split("/", 3)[2]
     except IndexError:
         print(f"Unable to detect hostname of URL: {url}", file=sys.stderr)
         return url
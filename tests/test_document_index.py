@@ -0,0 +1,144 @@
+import datetime
+
+import pytest
+
+from docstore.document_index import read_document_index
+from docstore.documents import write_documents
+from docstore.models import Document
+
+
+def test_index_of_blank_documents_is_empty(tmpdir):
+    index = read_document_index(tmpdir)
+    assert index.documents == []
+    assert index.tags == []
+
+
+def test_index_is_cached_until_documents_change(tmpdir):
+    doc1 = Document(title="Doc1", tags=["tag1", "tag2"])
+    write_documents(root=tmpdir, documents=[doc1])
+
+    index = read_document_index(tmpdir)
+    assert index.documents == [doc1]
+    assert index.tags == [{"tag1", "tag2"}]
+
+    assert read_document_index(tmpdir) is index
+
+    doc2 = Document(title="Doc2", tags=["tag3"])
+    write_documents(root=tmpdir, documents=[doc1, doc2])
+
+    new_index = read_document_index(tmpdir)
+    assert new_index is not index
+    assert len(new_index.documents) == 2
+
+
+def test_finds_documents_with_every_tag(tmpdir):
+    documents = [
+        Document(title="Doc0", tags=["tag1"]),
+        Document(title="Doc1", tags=["tag1", "tag2"]),
+        Document(title="Doc2", tags=["tag2", "tag3"]),
+        Document(title="Doc3", tags=[]),
+    ]
+    write_documents(root=tmpdir, documents=documents)
+
+    index = read_document_index(tmpdir)
+    titles = [doc.title for doc in index.documents]
+
+    def matching_titles(request_tags):
+        return {titles[i] for i in index.matching_positions(request_tags)}
+
+    assert matching_titles(set()) == {"Doc0", "Doc1", "Doc2", "Doc3"}
+    assert matching_titles({"tag1"}) == {"Doc0", "Doc1"}
+    assert matching_titles({"tag2"}) == {"Doc1", "Doc2"}
+    assert matching_titles({"tag1", "tag2"}) == {"Doc1"}
+    assert matching_titles({"tag1", "tag3"}) == set()
+    assert matching_titles({"doesnotexist"}) == set()
+
+
+def test_tallies_tags(tmpdir):
+    documents = [
+        Document(title="Doc0", tags=["tag1"]),
+        Document(title="Doc1", tags=["tag1", "tag2"]),
+        Document(title="Doc2", tags=["tag2", "tag3"]),
+    ]
+    write_documents(root=tmpdir, documents=documents)
+
+    index = read_document_index(tmpdir)
+
+    all_positions = index.matching_positions(set())
+    assert index.tally_tags(all_positions) == {"tag1": 2, "tag2": 2, "tag3": 1}
+
+    tag2_positions = index.matching_positions({"tag2"})
+    assert index.tally_tags(tag2_positions) == {"tag1": 1, "tag2": 2, "tag3": 1}
+
+    tag3_positions = index.matching_positions({"tag3"})
+    assert index.tally_tags(tag3_positions) == {"tag2": 1, "tag3": 1}
+
+
+@pytest.mark.parametrize(
+    "sort_by, expected_titles",
+    [
+        ("date (newest first)", ["beta", "Alpha", "gamma"]),
+        ("date (oldest first)", ["gamma", "Alpha", "beta"]),
+        ("title (A to Z)", ["Alpha", "beta", "gamma"]),
+        ("title (Z to A)", ["gamma", "beta", "Alpha"]),
+    ],
+)
+def test_sorts_documents(tmpdir, sort_by, expected_titles):
+    documents = [
+        Document(title="Alpha", date_saved=datetime.datetime(2002, 2, 2)),
+        Document(title="beta", date_saved=datetime.datetime(2003, 3, 3)),
+        Document(title="gamma", date_saved=datetime.datetime(2001, 1, 1)),
+    ]
+    write_documents(root=tmpdir, documents=documents)
+
+    index = read_document_index(tmpdir)
+    positions = index.sorted_positions(sort_by)
+
+    assert [index.documents[i].title for i in positions] == expected_titles
+    assert index.sorted_positions(sort_by) is positions
+
+
+def test_sort_cache_doesnt_grow_with_different_sort_strings(tmpdir):
+    write_documents(root=tmpdir, documents=[Document(title="Alpha")])
+
+    index = read_document_index(tmpdir)
+
+    for i in range(50):
+        index.sorted_positions(f"date{i}")
+
+    assert len(index._sorted_positions) == 1
+
+
+def test_unrecognised_sort_is_error(tmpdir):
+    index = read_document_index(tmpdir)
+
+    with pytest.raises(ValueError, match="Unrecognised sortBy"):
+        index.sorted_positions("shuffle")
+
+
+def test_groups_attribution_tags(tmpdir):
+    doc = Document(
+        title="My document",
+        tags=[
+            "by:John Smith",
+            "tag2",
+            "from:ACME Corp",
+            "by:Jane Doe",
+            "tag1",
+            "zebra",
+            "Apple",
+            "banana",
+            "Zoo",
+        ],
+    )
+    write_documents(root=tmpdir, documents=[doc])
+
+    index = read_document_index(tmpdir)
+
+    assert index.tag_groups == [
+        {
+            "by:": ("by:John Smith", "by:Jane Doe"),
+            "from:": ("from:ACME Corp",),
+            "other": ("Apple", "banana", "tag1", "tag2", "zebra", "Zoo"),
+        }
+    ]
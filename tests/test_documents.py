@@ -1,17 +1,25 @@
 import datetime
+import hashlib
 import json
 import os
 import shutil
 
+import pytest
+
 from docstore.documents import (
+    append_document,
+    append_documents,
+    db_version,
     delete_document,
+    file_checksum,
     pairwise_merge_documents,
     read_documents,
     sha256,
     store_new_document,
+    store_new_documents,
     write_documents,
 )
-from docstore.models import Dimensions, Document, File, Thumbnail
+from docstore.models import Dimensions, Document, File, Thumbnail, to_json_line
 
 
 def test_sha256():
@@ -21,6 +29,35 @@ def test_sha256():
     )
 
 
+def test_file_checksum_can_use_other_algorithms():
+    with open("tests/files/cluster.png", "rb") as infile:
+        expected = hashlib.blake2b(infile.read()).hexdigest()
+
+    assert (
+        file_checksum("tests/files/cluster.png", algorithm="blake2b")
+        == "blake2b:%s" % expected
+    )
+
+
+def test_file_checksum_without_file_digest(tmpdir, monkeypatch):
+    # hashlib.file_digest() was added in Python 3.11; on older versions
+    # we read the file ourselves.  Use a file bigger than one read buffer.
+    path = tmpdir / "large.bin"
+    path.write_binary(os.urandom(600 * 1024))
+
+    expected = file_checksum(path)
+
+    monkeypatch.delattr(hashlib, "file_digest", raising=False)
+
+    assert file_checksum(path) == expected
+    assert expected == "sha256:%s" % hashlib.sha256(path.read_binary()).hexdigest()
+
+
+def test_file_checksum_rejects_unknown_algorithms():
+    with pytest.raises(ValueError):
+        file_checksum("tests/files/cluster.png", algorithm="blake3")
+
+
 def test_read_blank_documents_is_empty(tmpdir):
     assert read_documents(tmpdir) == []
 
@@ -35,6 +72,42 @@ def test_can_write_and_read_documents(tmpdir):
         assert read_documents(tmpdir) == documents
 
 
+def test_writing_documents_replaces_the_database(tmpdir):
+    write_documents(root=tmpdir, documents=[Document(title="Doc1")])
+    write_documents(root=tmpdir, documents=[Document(title="Doc2")])
+
+    assert os.listdir(tmpdir) == ["documents.json"]
+    assert [d.title for d in read_documents(tmpdir)] == ["Doc2"]
+
+
+def test_reads_documents_from_the_right_root(tmpdir):
+    root1 = tmpdir / "root1"
+    root2 = tmpdir / "root2"
+
+    documents1 = [Document(title="A document in root1")]
+    documents2 = [Document(title="A document in root2")]
+
+    write_documents(root=root1, documents=documents1)
+    write_documents(root=root2, documents=documents2)
+
+    # Repeat a couple of times so we hit the caching paths.
+    for _ in range(3):
+        assert read_documents(root1) == documents1
+        assert read_documents(root2) == documents2
+
+
+def test_sees_changes_to_documents(tmpdir):
+    doc1 = Document(title="Doc1", date_saved=datetime.datetime(2010, 1, 1))
+    doc2 = Document(title="Doc2", date_saved=datetime.datetime(2002, 2, 2))
+
+    write_documents(root=tmpdir, documents=[doc1])
+    assert read_documents(tmpdir) == [doc1]
+
+    documents = [doc1, doc2]
+    write_documents(root=tmpdir, documents=documents)
+    assert read_documents(tmpdir) == documents
+
+
 def test_can_merge_documents(tmpdir, root):
     shutil.copyfile(src="tests/files/cluster.png", dst=tmpdir / "cluster1.png")
     shutil.copyfile(src="tests/files/cluster.png", dst=tmpdir / "cluster2.png")
@@ -169,6 +242,67 @@ def test_store_new_document(tmpdir):
     assert len(os.listdir(root / "thumbnails" / "m")) == 2
 
 
+def test_store_new_documents(tmpdir):
+    root = tmpdir / "root"
+    now = datetime.datetime(2020, 2, 20)
+
+    new_documents = []
+
+    for i in range(3):
+        shutil.copyfile(
+            src="tests/files/cluster.png", dst=tmpdir / f"My Cluster {i}.png"
+        )
+        new_documents.append(
+            {
+                "path": tmpdir / f"My Cluster {i}.png",
+                "title": f"Cluster {i}",
+                "tags": [f"tag{i}"],
+                "source_url": f"https://example.org/cluster{i}.png",
+                "date_saved": now,
+            }
+        )
+
+    stored_documents = store_new_documents(root=root, new_documents=new_documents)
+
+    assert [doc.title for doc in stored_documents] == [
+        "Cluster 0",
+        "Cluster 1",
+        "Cluster 2",
+    ]
+    assert read_documents(root) == stored_documents
+
+    for doc in stored_documents:
+        assert (
+            doc.files[0].checksum
+            == "sha256:683cbee0c2dda22b42fd92bda0f31e4b6b49cd8650a7924d72a14a30f11bfbe5"
+        )
+
+    for i in range(3):
+        assert not os.path.exists(tmpdir / f"My Cluster {i}.png")
+
+
+def test_append_documents_writes_them_all_to_the_log(tmpdir):
+    doc1 = Document(title="Doc1", date_saved=datetime.datetime(2010, 1, 1))
+    doc2 = Document(title="Doc2", date_saved=datetime.datetime(2002, 2, 2))
+    doc3 = Document(title="Doc3", date_saved=datetime.datetime(2001, 1, 1))
+
+    write_documents(root=tmpdir, documents=[doc1])
+    append_documents(root=tmpdir, documents=[doc2, doc3])
+
+    assert len(open(tmpdir / "documents.log", "rb").readlines()) == 2
+    assert read_documents(tmpdir) == [doc1, doc2, doc3]
+
+
+def test_appending_no_documents_doesnt_change_the_database(tmpdir):
+    write_documents(root=tmpdir, documents=[Document(title="Doc1")])
+    version = db_version(tmpdir)
+
+    assert store_new_documents(root=tmpdir, new_documents=[]) == []
+
+    assert not os.path.exists(tmpdir / "documents.log")
+    assert db_version(tmpdir) == version
+
+
 def test_deleting_document(tmpdir, root):
     root = tmpdir / "root"
     shutil.copyfile(src="tests/files/cluster.png", dst=tmpdir / "cluster.png")
@@ -197,3 +331,140 @@ def test_deleting_document(tmpdir, root):
     assert json.load(open(deleted_json_path))["id"] == doc1.id
     assert not os.path.exists(root / "files" / "c" / "cluster.png")
     assert os.path.exists(root / "deleted" / doc1.id / "cluster.png")
+
+
+def test_appending_a_document_doesnt_rewrite_the_database(tmpdir):
+    doc1 = Document(title="Doc1", date_saved=datetime.datetime(2010, 1, 1))
+    doc2 = Document(title="Doc2", date_saved=datetime.datetime(2002, 2, 2))
+
+    append_document(root=tmpdir, document=doc1)
+    assert read_documents(tmpdir) == [doc1]
+
+    db_contents = open(tmpdir / "documents.json", "rb").read()
+
+    append_document(root=tmpdir, document=doc2)
+    assert read_documents(tmpdir) == [doc1, doc2]
+    assert open(tmpdir / "documents.json", "rb").read() == db_contents
+
+    # Writing the database folds the log into documents.json
+    write_documents(root=tmpdir, documents=[doc1, doc2])
+    assert not os.path.exists(tmpdir / "documents.log")
+    assert read_documents(tmpdir) == [doc1, doc2]
+
+
+def test_ignores_a_partial_line_at_the_end_of_the_log(tmpdir):
+    doc1 = Document(title="Doc1", date_saved=datetime.datetime(2010, 1, 1))
+    doc2 = Document(title="Doc2", date_saved=datetime.datetime(2002, 2, 2))
+
+    append_document(root=tmpdir, document=doc1)
+    append_document(root=tmpdir, document=doc2)
+
+    # e.g. if the process was killed halfway through writing a line
+    with open(tmpdir / "documents.log", "ab") as out_file:
+        out_file.write(b'{"title": "c", "id"')
+
+    assert read_documents(tmpdir) == [doc1, doc2]
+
+
+def test_appending_removes_a_partial_line_at_the_end_of_the_log(tmpdir):
+    doc1 = Document(title="Doc1", date_saved=datetime.datetime(2010, 1, 1))
+    doc2 = Document(title="Doc2", date_saved=datetime.datetime(2002, 2, 2))
+    doc3 = Document(title="Doc3", date_saved=datetime.datetime(2001, 1, 1))
+
+    append_document(root=tmpdir, document=doc1)
+    append_document(root=tmpdir, document=doc2)
+
+    with open(tmpdir / "documents.log", "ab") as out_file:
+        out_file.write(b'{"title": "c", "id"')
+
+    append_document(root=tmpdir, document=doc3)
+
+    assert b'"id"{' not in open(tmpdir / "documents.log", "rb").read()
+    assert len(open(tmpdir / "documents.log", "rb").readlines()) == 2
+    assert read_documents(tmpdir) == [doc1, doc2, doc3]
+
+
+def test_reads_a_line_which_was_half_written_on_the_previous_read(tmpdir):
+    doc1 = Document(title="Doc1", date_saved=datetime.datetime(2010, 1, 1))
+    doc2 = Document(title="Doc2", date_saved=datetime.datetime(2002, 2, 2))
+    doc3 = Document(title="Doc3", date_saved=datetime.datetime(2001, 1, 1))
+
+    append_document(root=tmpdir, document=doc1)
+    append_document(root=tmpdir, document=doc2)
+
+    # Simulate reading the log while somebody else is partway through
+    # writing a line to it.
+    line = to_json_line(doc3)
+
+    with open(tmpdir / "documents.log", "ab") as out_file:
+        out_file.write(line[:10])
+
+    assert read_documents(tmpdir) == [doc1, doc2]
+
+    with open(tmpdir / "documents.log", "ab") as out_file:
+        out_file.write(line[10:])
+
+    assert read_documents(tmpdir) == [doc1, doc2, doc3]
+
+
+def test_skips_logged_documents_which_are_already_in_the_database(tmpdir):
+    doc1 = Document(title="Doc1", date_saved=datetime.datetime(2010, 1, 1))
+    doc2 = Document(title="Doc2", date_saved=datetime.datetime(2002, 2, 2))
+
+    append_document(root=tmpdir, document=doc1)
+    append_document(root=tmpdir, document=doc2)
+    log_contents = open(tmpdir / "documents.log", "rb").read()
+
+    # Simulate a crash after documents.json was written, but before the
+    # log was cleared.
+    write_documents(root=tmpdir, documents=[doc1, doc2])
+    open(tmpdir / "documents.log", "wb").write(log_contents)
+
+    assert read_documents(tmpdir) == [doc1, doc2]
+
+
+def test_only_reads_new_documents_in_the_log(tmpdir, monkeypatch):
+    doc1 = Document(title="Doc1", date_saved=datetime.datetime(2010, 1, 1))
+    doc2 = Document(title="Doc2", date_saved=datetime.datetime(2002, 2, 2))
+    doc3 = Document(title="Doc3", date_saved=datetime.datetime(2003, 3, 3))
+
+    write_documents(root=tmpdir, documents=[doc1])
+    assert read_documents(tmpdir) == [doc1]
+
+    # Once the database has been read, appending documents shouldn't
+    # cause documents.json to be parsed again.
+    import docstore.documents
+
+    def from_json(_):
+        raise AssertionError("Should not be re-reading documents.json")
+
+    monkeypatch.setattr(docstore.documents, "from_json", from_json)
+
+    append_document(root=tmpdir, document=doc2)
+    assert read_documents(tmpdir) == [doc1, doc2]
+
+    append_document(root=tmpdir, document=doc3)
+    assert read_documents(tmpdir) == [doc1, doc2, doc3]
+
+
+def test_folds_the_log_into_the_database_when_it_gets_big(tmpdir, monkeypatch):
+    import docstore.documents
+
+    monkeypatch.setattr(docstore.documents, "MIN_LOG_COMPACTION_SIZE", 0)
+
+    documents = [Document(title=f"Doc{i}", tags=["tag1", "tag2"]) for i in range(5)]
+    write_documents(root=tmpdir, documents=documents)
+
+    db_size = os.stat(tmpdir / "documents.json").st_size
+
+    new_documents = []
+    while os.path.exists(tmpdir / "documents.log") or not new_documents:
+        new_doc = Document(title=f"New doc {len(new_documents)}")
+        append_document(root=tmpdir, document=new_doc)
+        new_documents.append(new_doc)
+
+    assert len(new_documents) > 1
+    assert os.stat(tmpdir / "documents.json").st_size > db_size
+
+    stored_ids = {d.id for d in read_documents(tmpdir)}
+    assert stored_ids == {d.id for d in documents + new_documents}
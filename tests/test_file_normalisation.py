@@ -1,7 +1,8 @@
 import concurrent.futures
+import hashlib
 import os
 
-from docstore.file_normalisation import normalised_filename_copy
+from docstore.file_normalisation import create_directory, normalised_filename_copy
 
 
 def test_copies_a_file(tmpdir):
@@ -77,3 +78,35 @@ def test_copies_multiple_files_concurrently(tmpdir):
     }
 
     assert dst_contents == {"Hello world", "Bonjour le monde", "Hallo Welt"}
+
+
+def test_can_hash_a_file_while_copying(tmpdir):
+    src = tmpdir / "src.txt"
+    dst = tmpdir / "dst.txt"
+
+    src.write("Hello world")
+
+    hasher = hashlib.sha256()
+    normalised_filename_copy(src=src, dst=dst, hasher=hasher)
+
+    assert dst.read() == "Hello world"
+    assert hasher.hexdigest() == hashlib.sha256(b"Hello world").hexdigest()
+
+
+def test_only_creates_a_directory_once(tmpdir, monkeypatch):
+    calls = []
+    makedirs = os.makedirs
+
+    def tracking_makedirs(path, *args, **kwargs):
+        calls.append(path)
+        makedirs(path, *args, **kwargs)
+
+    monkeypatch.setattr(os, "makedirs", tracking_makedirs)
+
+    create_directory(tmpdir / "a")
+    create_directory(tmpdir / "a")
+    create_directory(tmpdir / "b")
+
+    assert os.path.isdir(tmpdir / "a")
+    assert os.path.isdir(tmpdir / "b")
+    assert calls == [str(tmpdir / "a"), str(tmpdir / "b")]
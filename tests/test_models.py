@@ -3,7 +3,16 @@ import uuid
 
 import pytest
 
-from docstore.models import Dimensions, Document, File, Thumbnail, from_json, to_json
+from docstore.models import (
+    Dimensions,
+    Document,
+    File,
+    Thumbnail,
+    from_json,
+    from_json_line,
+    to_json,
+    to_json_line,
+)
 
 
 def is_recent(ds):
@@ -52,9 +61,39 @@ def test_can_serialise_document_to_json():
 
     documents = [Document(title="Another test document", files=[f])]
     assert from_json(to_json(documents)) == documents
+    assert from_json(memoryview(to_json(documents))) == documents
+
+
+def test_can_serialise_document_to_json_line():
+    f = File(
+        filename="cats.jpg",
+        path="files/c/cats.jpg",
+        size=100,
+        checksum="sha256:123",
+        thumbnail=Thumbnail(
+            path="thumbnails/c/cats.jpg",
+            dimensions=Dimensions(400, 300),
+            tint_color="#ffffff",
+        ),
+    )
+
+    document = Document(title="Another test document", files=[f])
+    json_line = to_json_line(document)
+
+    assert json_line.endswith(b"\n")
+    assert json_line.count(b"\n") == 1
+    assert from_json_line(json_line) == document
 
 
 @pytest.mark.parametrize("documents", [[1, 2, 3], {"a", "b", "c"}])
 def test_to_json_with_bad_list_is_typeerror(documents):
     with pytest.raises(TypeError, match=r"Expected type List\[Document\]!"):
         to_json(documents)
+
+
+def test_document_tags_are_interned():
+    d1 = Document(title="A document", tags=["".join(["t", "a", "g"])])
+    d2 = Document(title="Another document", tags=["".join(["t", "a", "g"])])
+
+    assert d1.tags == ["tag"]
+    assert d1.tags[0] is d2.tags[0]
@@ -1,6 +1,8 @@
 import datetime
+import os
 import re
 import shutil
+import types
 
 import bs4
 import pytest
@@ -19,6 +21,28 @@ def client(root):
         yield client
 
 
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Fix the time that the server thinks it is, so tests don't depend on
+    when they run.  Set ``clock.current`` to move it.
+    """
+
+    class Clock(datetime.datetime):
+        current = datetime.datetime(2021, 1, 1, 12, 0, 0)
+
+        @classmethod
+        def now(cls, tz=None):
+            return cls.current
+
+    monkeypatch.setattr(
+        "docstore.server.datetime",
+        types.SimpleNamespace(datetime=Clock, timedelta=datetime.timedelta),
+    )
+
+    return Clock
+
+
 def test_empty_response(client):
     resp = client.get("/")
     assert resp.status_code == 200
@@ -50,6 +74,130 @@ def test_shows_documents(tmpdir, root, client):
     assert resp.data == open("tests/files/cluster.png", "rb").read()
 
 
+def test_can_send_thumbnails_with_x_sendfile(root):
+    app = create_app(
+        root=root,
+        title="My test instance",
+        thumbnail_width=200,
+        use_x_sendfile=True,
+    )
+    app.config["TESTING"] = True
+
+    os.makedirs(root / "thumbnails" / "c")
+    shutil.copyfile(
+        "tests/files/cluster.png", root / "thumbnails" / "c" / "cluster.png"
+    )
+
+    with app.test_client() as client:
+        resp = client.get("/thumbnails/c/cluster.png")
+
+    assert resp.status_code == 200
+    assert resp.headers["X-Sendfile"] == os.path.abspath(
+        root / "thumbnails" / "c" / "cluster.png"
+    )
+    assert resp.data == b""
+
+
+def test_list_of_documents_has_the_same_etag_in_every_process(root, clock):
+    write_documents(root=root, documents=[Document(title="Document 1")])
+
+    etags = []
+
+    # Each server process calls create_app() separately
+    for _ in range(2):
+        app = create_app(root=root, title="My test instance", thumbnail_width=200)
+
+        with app.test_client() as client:
+            resp = client.get("/")
+            assert b"Document 1" in resp.data
+            etags.append(resp.headers["ETag"])
+
+    assert etags[0] == etags[1]
+
+
+def test_list_of_documents_can_be_cached(root, client, clock):
+    write_documents(root=root, documents=[Document(title="Document 1")])
+
+    resp = client.get("/")
+    assert resp.status_code == 200
+    assert b"Document 1" in resp.data
+    assert resp.headers["Cache-Control"] == "no-cache"
+    etag = resp.headers["ETag"]
+
+    # If nothing has changed, the browser can use the page it already has
+    resp = client.get("/", headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.data == b""
+
+    # Different query parameters are a different page
+    resp = client.get("/?tag=tag1", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert b"no documents found!" in resp.data
+
+    # If the documents change, the page is rendered again
+    write_documents(
+        root=root,
+        documents=[Document(title="Document 1"), Document(title="Document 2")],
+    )
+
+    resp = client.get("/", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert b"Document 2" in resp.data
+
+
+def test_cached_list_with_recent_documents_expires_every_minute(root, client, clock):
+    write_documents(
+        root=root,
+        documents=[
+            Document(title="Document 1", date_saved=datetime.datetime(2021, 1, 1, 12))
+        ],
+    )
+
+    resp = client.get("/")
+    assert b"date saved: just now" in resp.data
+    etag = resp.headers["ETag"]
+
+    clock.current = datetime.datetime(2021, 1, 1, 12, 0, 59)
+    resp = client.get("/", headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+
+    clock.current = datetime.datetime(2021, 1, 1, 12, 5, 0)
+    resp = client.get("/", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert b"date saved: 5 minutes ago" in resp.data
+
+
+def test_cached_list_with_old_documents_expires_every_day(root, client, clock):
+    write_documents(
+        root=root,
+        documents=[
+            Document(title="Document 1", date_saved=datetime.datetime(2021, 1, 1, 9))
+        ],
+    )
+
+    resp = client.get("/")
+    assert b"date saved: earlier today" in resp.data
+    etag = resp.headers["ETag"]
+
+    clock.current = datetime.datetime(2021, 1, 1, 23, 59, 0)
+    resp = client.get("/", headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+
+    clock.current = datetime.datetime(2021, 1, 2, 0, 1, 0)
+    resp = client.get("/", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert b"date saved: yesterday" in resp.data
+
+
+def test_random_sort_is_not_cached(root, client):
+    write_documents(root=root, documents=[Document(title="Document 1")])
+
+    resp = client.get("/?sortBy=random")
+    assert resp.status_code == 200
+    assert b"Document 1" in resp.data
+    assert "ETag" not in resp.headers
+
+
 def test_filters_documents_by_tag(root, client):
     documents = [Document(title=f"Document {i}", tags=[f"tag{i}"]) for i in range(3)]
     write_documents(root=root, documents=documents)
@@ -61,6 +209,20 @@ def test_filters_documents_by_tag(root, client):
     assert b"Document 2" not in resp.data
 
 
+def test_links_to_remove_tag_filters(root, client):
+    documents = [Document(title="Document", tags=["tag1", "tag2"])]
+    write_documents(root=root, documents=documents)
+
+    # The order of the query parameters in the URL doesn't matter
+    for url in ["/?tag=tag1&tag=tag2", "/?tag=tag2&tag=tag1"]:
+        resp = client.get(url)
+        assert resp.status_code == 200
+
+        soup = bs4.BeautifulSoup(resp.data, "html.parser")
+        remove_links = {a["href"] for a in soup.find_all("a", class_="remove_tag")}
+        assert remove_links == {"?tag=tag1", "?tag=tag2"}
+
+
 def test_paginates_document(root, client):
     documents = [Document(title=f"Document {i}") for i in range(200)]
     write_documents(root=root, documents=documents)
@@ -83,6 +245,26 @@ def test_paginates_document(root, client):
     assert b"Document 0" in resp_page_2.data
 
 
+def test_paginates_filtered_documents(root, client):
+    documents = [
+        Document(title=f"Document {i}", tags=["even" if i % 2 == 0 else "odd"])
+        for i in range(300)
+    ]
+    write_documents(root=root, documents=documents)
+
+    resp = client.get("/?tag=even")
+    assert resp.status_code == 200
+    assert "showing documents 1&ndash;100 of 150." in tidy(resp.data.decode("utf8"))
+    assert resp.data.count(b'<div class="doc_preview"') == 100
+
+    resp_page_2 = client.get("/?tag=even&page=2")
+    assert resp_page_2.status_code == 200
+    assert "showing documents 101&ndash;150 of 150." in tidy(
+        resp_page_2.data.decode("utf8")
+    )
+    assert resp_page_2.data.count(b'<div class="doc_preview"') == 50
+
+
 def test_documents_with_lots_of_tags(root, client):
     documents = [Document(title=f"Document {i}", tags=[f"tag{i}"]) for i in range(200)]
 
@@ -28,6 +28,13 @@ def test_common_prefix(values, expected_prefix):
         ("a b", "a-b"),
         ("a_b", "a-b"),
         ("a  b", "a-b"),
+        ("a - b", "a-b"),
+        ("Crème Brûlée: A History", "creme-brulee-a-history"),
+        ("Straße", "strasse"),
+        ("Ørsted", "orsted"),
+        ("日本", "ri-ben-"),
+        ("Don´t", "dont"),
+        ("aͤb", "aeb"),
     ],
 )
 def test_slugify(u, expected_slug):